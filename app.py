@@ -6,12 +6,40 @@ Main application file for document processing and Q&A
 import streamlit as st
 import tempfile
 import os
+import shutil
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 import sys
 
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent))
 
+try:
+    from ingestion.parser import MultiModalParser
+    from ingestion.ocr import ocr_worker, init_ocr_worker
+    from chunking.semantic_chunker import SemanticChunker, chunk_text_worker
+    from embedding.multimodal_vector_store import MultiModalVectorStore
+    _HAVE_DEPS = True
+    _IMPORT_ERR = None
+except ImportError as e:
+    _HAVE_DEPS = False
+    _IMPORT_ERR = e
+
+try:
+    from generation.qa_engine import QAEngine
+    _HAVE_QA = True
+except ImportError:
+    _HAVE_QA = False
+
+# Number of chunks handed to the vector store per add_arrays call
+INDEX_BATCH_SIZE = 1000
+
+# Minimum seconds between redraws of a streaming answer
+STREAM_RENDER_INTERVAL = 0.1
+
 # Page configuration
 st.set_page_config(
     page_title="Multi-Modal RAG System",
@@ -58,6 +86,41 @@ def initialize_session_state():
     if 'num_chunks' not in st.session_state:
         st.session_state['num_chunks'] = 0
 
+@st.cache_resource
+def get_parser():
+    """Shared document parser, kept across reruns"""
+    return MultiModalParser()
+
+@st.cache_resource
+def get_process_pool():
+    """Shared worker pool for OCR and chunking; workers keep their OCREngine warm"""
+    return ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=init_ocr_worker)
+
+def reset_process_pool():
+    """Drop a pool whose worker died; the next get_process_pool() starts a fresh one"""
+    get_process_pool().shutdown(wait=False, cancel_futures=True)
+    get_process_pool.clear()
+
+@st.cache_resource(max_entries=8)
+def get_vector_store(collection_name: str, index_version: int):
+    """Persisted collection, loaded once with its keyword index and shared across sessions
+
+    index_version (see MultiModalVectorStore.index_version) is part of the cache key,
+    so a collection deleted or rebuilt on disk is loaded afresh rather than served stale.
+    """
+    vector_store = MultiModalVectorStore(collection_name=collection_name)
+    # Raising keeps a broken collection out of the cache
+    if vector_store.load_error:
+        raise ValueError(f"Stored index could not be loaded ({vector_store.load_error})")
+    if vector_store.index.ntotal == 0:
+        raise ValueError("Stored index is empty")
+    return vector_store
+
+@st.cache_resource(max_entries=4)
+def get_qa_engine(store_id: int, api_key: str, _vector_store):
+    """QA engine keyed on the active vector store and API key"""
+    return QAEngine(_vector_store, api_key=api_key)
+
 def main():
     # Initialize session state
     initialize_session_state()
@@ -107,6 +170,19 @@ def main():
         
         st.markdown("---")
         
+        # Previously processed documents
+        collections = MultiModalVectorStore.list_collections() if _HAVE_DEPS else []
+        if collections:
+            st.header(" Processed Documents")
+            selected = st.selectbox("Stored indexes", collections)
+            if st.button(" Load Index", use_container_width=True):
+                try:
+                    load_collection(selected, selected)
+                except ValueError as e:
+                    st.error(f" {e}. Upload the document again to rebuild it.")
+            
+            st.markdown("---")
+        
         # Stats
         if st.session_state['vector_store'] is not None:
             st.header(" Statistics")
@@ -115,7 +191,9 @@ def main():
             st.metric("Documents", stats['total_documents'])
             
             if st.button(" Clear Database", use_container_width=True):
-                st.session_state['vector_store'].clear()
+                # Delete by name: the loaded store may be shared with other sessions,
+                # which keep their in-memory copy until they load something else
+                MultiModalVectorStore.delete(st.session_state['vector_store'].collection_name)
                 st.session_state['vector_store'] = None
                 st.session_state['processed_file'] = None
                 st.session_state['num_chunks'] = 0
@@ -165,88 +243,155 @@ def show_welcome_screen():
     
     st.info(" Start by uploading a PDF document in the sidebar")
 
+def load_collection(collection_name, display_name):
+    """Make a persisted collection the active vector store"""
+    vector_store = get_vector_store(collection_name, MultiModalVectorStore.index_version(collection_name))
+    st.session_state['vector_store'] = vector_store
+    st.session_state['processed_file'] = display_name
+    st.session_state['num_chunks'] = vector_store.get_stats()['total_documents']
+
 def process_document(uploaded_file):
     """Process uploaded document"""
-    try:
-        from ingestion.parser import MultiModalParser
-        from ingestion.ocr import OCREngine
-        from chunking.semantic_chunker import SemanticChunker
-        from embedding.multimodal_vector_store import MultiModalVectorStore
-    except ImportError as e:
-        st.error(f" Missing required modules: {str(e)}")
+    if not _HAVE_DEPS:
+        st.error(f" Missing required modules: {str(_IMPORT_ERR)}")
         return
     
+    # Same bytes and chunk size map to the same persisted collection
+    chunk_size = st.session_state.get('chunk_size', 512)
+    digest = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()[:16]
+    collection_name = f"{digest}_{chunk_size}"
+    if MultiModalVectorStore.exists(collection_name):
+        try:
+            load_collection(collection_name, uploaded_file.name)
+            st.success(f" Loaded previously processed index for {uploaded_file.name}")
+            return
+        except ValueError as e:
+            # Inconsistent or empty files on disk; rebuild, and the rename replaces them
+            st.warning(f" {e}. Reprocessing the document.")
+    
+    tmp_path = None
+    vector_store = None
+    MultiModalVectorStore.sweep_partials()
     with st.spinner(" Processing document... This may take a minute."):
         try:
+            # Stream the upload to disk in 1 MiB blocks instead of copying it whole
             with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
                 tmp_path = tmp_file.name
+                uploaded_file.seek(0)
+                shutil.copyfileobj(uploaded_file, tmp_file, length=1024 * 1024)
             
             progress_bar = st.progress(0)
             status_text = st.empty()
             
             status_text.text(" Parsing document...")
             progress_bar.progress(20)
-            parser = MultiModalParser()
-            elements = parser.parse_document(tmp_path)
+            parser = get_parser()
+            elements = parser.parse_document(tmp_path, executor=get_process_pool())
             
             status_text.text(" Running OCR on images...")
             progress_bar.progress(40)
-            ocr_engine = OCREngine()
-            for elem in elements:
-                if elem.type == 'image':
-                    elem.metadata['ocr_text'] = ocr_engine.extract_text_from_image(elem.content)
+            image_elems = [e for e in elements if e.type == 'image']
+            if image_elems:
+                # OCR is CPU-bound, fan it out across cores
+                executor = get_process_pool()
+                futures = {
+                    executor.submit(ocr_worker, elem.content): i
+                    for i, elem in enumerate(image_elems)
+                }
+                for done, future in enumerate(as_completed(futures), 1):
+                    image_elems[futures[future]].metadata['ocr_text'] = future.result()
+                    progress_bar.progress(40 + int(20 * done / len(image_elems)))
             
             status_text.text(" Chunking content...")
             progress_bar.progress(60)
-            chunk_size = st.session_state.get('chunk_size', 512)
             chunker = SemanticChunker(chunk_size=chunk_size, overlap=50)
             
-            chunks = []
+            # Text elements are chunked independently, so fan them out across cores
+            text_jobs = [(e.content, e.page_num, chunk_size) for e in elements if e.type == 'text']
+            text_chunks = get_process_pool().map(chunk_text_worker, text_jobs)
+            
+            # Column-oriented chunk data, handed to the vector store as-is
+            contents, pages, types, extra_meta, images = [], [], [], [], []
+            source = {'source': uploaded_file.name}
             for elem in elements:
                 if elem.type == 'text':
-                    chunks.extend(chunker.chunk_text(elem.content, elem.page_num))
+                    for chunk in next(text_chunks):
+                        contents.append(chunk['content'])
+                        pages.append(chunk['page'])
+                        types.append('text')
+                        extra_meta.append(source)
+                        images.append(None)
                 elif elem.type == 'table':
-                    chunks.append(chunker.chunk_table(elem.content, elem.page_num))
+                    chunk = chunker.chunk_table(elem.content, elem.page_num)
+                    contents.append(chunk['content'])
+                    pages.append(chunk['page'])
+                    types.append('table')
+                    extra_meta.append(source)
+                    images.append(None)
                 elif elem.type == 'image' and 'ocr_text' in elem.metadata:
-                    chunks.append({
-                        'type': 'image',
-                        'content': elem.metadata['ocr_text'],
-                        'page': elem.page_num,
-                        'ocr_text': elem.metadata['ocr_text']
-                    })
+                    contents.append(elem.metadata['ocr_text'])
+                    pages.append(elem.page_num)
+                    types.append('image')
+                    extra_meta.append(source)
+                    images.append(elem.content)
             
             status_text.text(" Indexing in vector database...")
             progress_bar.progress(80)
-            vector_store = MultiModalVectorStore(collection_name=uploaded_file.name.replace('.pdf', ''))
-            vector_store.add_documents(chunks)
+            # Build under a unique partial name, so an interrupted upload is never mistaken for a
+            # finished one and two sessions processing the same PDF never share files
+            vector_store = MultiModalVectorStore(
+                collection_name=MultiModalVectorStore.partial_name(collection_name)
+            )
+            for i in range(0, len(contents), INDEX_BATCH_SIZE):
+                batch = slice(i, i + INDEX_BATCH_SIZE)
+                vector_store.add_arrays(
+                    contents[batch], pages[batch], types[batch], extra_meta[batch], images[batch],
+                    persist=False
+                )
+                progress_bar.progress(80 + int(20 * min(i + INDEX_BATCH_SIZE, len(contents)) / len(contents)))
+            vector_store.save()  # indexes are written once, after the last batch
+            if MultiModalVectorStore.exists(collection_name):
+                # Another session finished the same document first; keep its copy
+                vector_store.clear()
+                vector_store = get_vector_store(collection_name, MultiModalVectorStore.index_version(collection_name))
+            else:
+                vector_store.rename(collection_name)
             
             progress_bar.progress(100)
             status_text.empty()
             
             st.session_state['vector_store'] = vector_store
             st.session_state['processed_file'] = uploaded_file.name
-            st.session_state['num_chunks'] = len(chunks)
-            
-            os.unlink(tmp_path)
+            st.session_state['num_chunks'] = len(contents)
             
-            st.success(f" Processed {len(elements)} elements into {len(chunks)} searchable chunks!")
+            st.success(f" Processed {len(elements)} elements into {len(contents)} searchable chunks!")
             st.balloons()
-            st.rerun()
             
+        except BrokenProcessPool:
+            # A worker was killed (out of memory, or a crash on a bad page or image)
+            reset_process_pool()
+            st.error(" A background worker crashed while processing this document. "
+                     "The workers have been restarted; please try uploading again.")
         except Exception as e:
             st.error(f" Error: {str(e)}")
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            # Drop the files of a build that did not make it to its final name
+            if vector_store is not None and vector_store.collection_name.endswith(MultiModalVectorStore.PARTIAL_SUFFIX):
+                vector_store.clear()
+
+def set_query(question: str = ''):
+    """Fill the question box before the next render"""
+    st.session_state['query_input'] = question
 
+@st.fragment
 def show_qa_interface():
-    """Display Q&A interface"""
+    """Display Q&A interface; reruns on its own without redrawing the sidebar"""
     st.markdown(f"###  Ask Questions About: {st.session_state['processed_file']}")
     
-    if 'current_query' not in st.session_state:
-        st.session_state['current_query'] = ''
-    
     query = st.text_input(
         "Enter your question:",
-        value=st.session_state.get('current_query', ''),
         placeholder="e.g., What are the main findings?",
         key="query_input"
     )
@@ -255,39 +400,59 @@ def show_qa_interface():
     with col1:
         search_button = st.button(" Search", type="primary", use_container_width=True)
     with col2:
-        if st.button(" Clear", use_container_width=True):
-            st.session_state['current_query'] = ''
-            st.rerun()
+        st.button(" Clear", use_container_width=True, on_click=set_query)
     
     st.markdown(" Try these:**")
     sample_cols = st.columns(3)
     samples = ["What is the main topic?", "Summarize key findings", "What projects are mentioned?"]
     
+    pending_query = query if search_button and query else None
     for i, (col, question) in enumerate(zip(sample_cols, samples)):
-        if col.button(question, key=f"sample_{i}"):
-            st.session_state['current_query'] = question
-            st.rerun()
+        if col.button(question, key=f"sample_{i}", on_click=set_query, args=(question,)):
+            pending_query = question
     
-    if search_button and query:
-        perform_search(query)
+    # Results render in place below the inputs, no script rerun needed
+    answer_placeholder = st.empty()
+    if pending_query:
+        with answer_placeholder.container():
+            perform_search(pending_query)
 
 def perform_search(query):
     """Perform search and display results"""
+    if not _HAVE_QA:
+        st.warning(" Using basic search mode")
+        show_basic_search(query)
+        return
+
     with st.spinner(" Generating answer..."):
         try:
-            from generation.qa_engine import QAEngine
-
             vector_store = st.session_state['vector_store']
             top_k = st.session_state.get('top_k', 5)
             search_type = st.session_state.get('search_type', 'Hybrid Search')
             api_key = st.session_state.get('api_key', '')
 
-            qa_engine = QAEngine(vector_store, api_key=api_key)
+            qa_engine = get_qa_engine(id(vector_store), api_key, vector_store)
+            
+            # Show the LLM answer as it streams, then replace it with the final box
+            stream_box = st.empty()
+            streamed = []
+            last_render = [0.0]
+            
+            def show_partial(text):
+                streamed.append(text)
+                # Redraw a few times a second, not once per token: each redraw re-sends the whole text
+                now = time.monotonic()
+                if now - last_render[0] >= STREAM_RENDER_INTERVAL:
+                    last_render[0] = now
+                    stream_box.markdown(''.join(streamed))
+            
             result = qa_engine.generate_answer(
                 query=query,
                 use_hybrid=(search_type == "Hybrid Search"),
-                top_k=top_k
+                top_k=top_k,
+                on_token=show_partial
             )
+            stream_box.empty()
             
             # Display answer prominently
             st.markdown(" Answer")
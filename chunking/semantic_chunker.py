@@ -1,73 +1,91 @@
 from typing import List, Tuple, Dict, Any
 import re
+from bisect import bisect_right
+from itertools import accumulate
 
-class SemanticChunker:
-    """Intelligently chunks documents preserving semantic meaning"""
-    
-    def __init__(self, chunk_size: int = 512, overlap: int = 50):
-        self.chunk_size = chunk_size
-        self.overlap = overlap
-    
-    def chunk_text(self, text: str, page_num: int) -> List[Dict[str, Any]]:
+_SENT_RE = re.compile(r'(?<=[.!?])\s+')
+
+def _make_chunker(chunk_size: int, overlap_sentences: int):
+    """Build a chunk_text implementation with its settings bound as closure variables"""
+    def chunk_text(text: str, page_num: int) -> List[Dict[str, Any]]:
         """Chunk text with semantic boundaries"""
         # Split by sentences
-        sentences = re.split(r'(?<=[.!?])\s+', text)
+        sentences = _SENT_RE.split(text)
+        n = len(sentences)
         
-        chunks = []
-        current_chunk = []
-        current_length = 0
+        # Prefix sums of word counts: offsets[i] is the word count of sentences[:i]
+        offsets = [0, *accumulate(map(len, map(str.split, sentences)))]
         
-        for sentence in sentences:
-            sentence_length = len(sentence.split())
-            
-            if current_length + sentence_length > self.chunk_size and current_chunk:
-                chunk_text = ' '.join(current_chunk)
-                chunks.append({
-                    'type': 'text',
-                    'content': chunk_text,
-                    'page': page_num,
-                    'word_count': current_length
-                })
-                
-                # Add overlap
-                overlap_sentences = current_chunk[-2:] if len(current_chunk) >= 2 else current_chunk
-                current_chunk = overlap_sentences + [sentence]
-                current_length = sum(len(s.split()) for s in current_chunk)
-            else:
-                current_chunk.append(sentence)
-                current_length += sentence_length
+        chunks = []
+        start = 0
+        min_end = 1  # a chunk always takes at least one new sentence
         
-        # Add remaining chunk
-        if current_chunk:
+        while True:
+            # Grow the chunk up to the last sentence that still fits chunk_size
+            end = max(bisect_right(offsets, offsets[start] + chunk_size) - 1, min_end)
+            if end >= n:
+                break
             chunks.append({
                 'type': 'text',
-                'content': ' '.join(current_chunk),
+                'content': ' '.join(sentences[start:end]),
                 'page': page_num,
-                'word_count': current_length
+                'word_count': offsets[end] - offsets[start]
             })
+            
+            # Add overlap
+            start = max(0, end - overlap_sentences)
+            min_end = end + 1
+        
+        # Add remaining chunk
+        chunks.append({
+            'type': 'text',
+            'content': ' '.join(sentences[start:]),
+            'page': page_num,
+            'word_count': offsets[n] - offsets[start]
+        })
         
         return chunks
+
+    return chunk_text
+
+class SemanticChunker:
+    """Intelligently chunks documents preserving semantic meaning"""
+    
+    def __init__(self, chunk_size: int = 512, overlap: int = 50, overlap_sentences: int = 2):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.overlap_sentences = overlap_sentences
+        self._chunk_text_impl = _make_chunker(chunk_size, overlap_sentences)
+    
+    def chunk_text(self, text: str, page_num: int) -> List[Dict[str, Any]]:
+        """Chunk text with semantic boundaries"""
+        return self._chunk_text_impl(text, page_num)
     
     def chunk_table(self, table: List[List[str]], page_num: int) -> Dict[str, Any]:
         """Convert table to searchable format"""
-        # Convert table to markdown-like text
-        text_representation = []
+        if not table:
+            return {
+                'type': 'table',
+                'content': '',
+                'page': page_num,
+                'metadata': {'rows': 0, 'columns': 0}
+            }
         
-        # Headers
-        if table and len(table) > 0:
-            headers = table[0]
-            text_representation.append(' | '.join(headers))
-            
-            # Rows
-            for row in table[1:]:
-                text_representation.append(' | '.join(str(cell) for cell in row))
+        # Convert table to markdown-like text, header row first
+        content = '\n'.join(' | '.join(map(str, row)) for row in table)
         
         return {
             'type': 'table',
-            'content': '\n'.join(text_representation),
+            'content': content,
             'page': page_num,
             'metadata': {
                 'rows': len(table),
-                'columns': len(table[0]) if table else 0
+                'columns': len(table[0])
             }
         }
+
+
+def chunk_text_worker(args: Tuple[str, int, int]) -> List[Dict[str, Any]]:
+    """Process pool entry point: chunk one text element"""
+    text, page_num, chunk_size = args
+    return SemanticChunker(chunk_size=chunk_size).chunk_text(text, page_num)
@@ -1,38 +1,212 @@
 from sentence_transformers import SentenceTransformer
 from transformers import CLIPProcessor, CLIPModel
 import torch
-from typing import Union, List
+from typing import Union, List, Optional, Hashable, Callable
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import hashlib
+import threading
 import numpy as np
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+def _digest(data: bytes) -> bytes:
+    """Short content hash used as an embedding cache key"""
+    if xxhash is not None:
+        return xxhash.xxh3_128_digest(data)
+    return hashlib.blake2b(data, digest_size=16).digest()
+
 class MultiModalEmbedder:
     """Generates embeddings for text, tables, and images"""
     
-    def __init__(self):
+    def __init__(self, cache_enabled: bool = True, cache_size: int = 4096):
+        # Run on the GPU when there is one; half precision only pays off there
+        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.vision_dtype = torch.float16 if self.device == 'cuda' else torch.float32
+        
         # Text embeddings - use a model with good performance
-        self.text_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.text_model = SentenceTransformer('all-MiniLM-L6-v2', device=self.device)
+        
+        # Vision embeddings - CLIP for image understanding, loaded on first use so
+        # text-only workloads never pay for its weights
+        self._vision_model = None
+        self._vision_processor = None
+        self._vision_lock = threading.Lock()
         
-        # Vision embeddings - CLIP for image understanding
-        self.vision_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-        self.vision_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+        # LRU cache of embeddings keyed by content hash
+        self.cache_enabled = cache_enabled
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        # The shared embedder serves every Streamlit session thread
+        self._cache_lock = threading.Lock()
+    
+    def _load_vision(self):
+        """Load CLIP once, even when several threads ask for it together"""
+        with self._vision_lock:
+            if self._vision_model is None:
+                self._vision_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+                self._vision_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32").to(
+                    self.device, dtype=self.vision_dtype
+                ).eval()
+    
+    @property
+    def vision_model(self) -> CLIPModel:
+        if self._vision_model is None:
+            self._load_vision()
+        return self._vision_model
+    
+    @property
+    def vision_processor(self) -> CLIPProcessor:
+        if self._vision_model is None:
+            self._load_vision()
+        return self._vision_processor
+    
+    def _cache_get(self, key: Hashable) -> Optional[np.ndarray]:
+        """Look up a cached embedding, marking it most recently used"""
+        with self._cache_lock:
+            embedding = self._cache.get(key)
+            if embedding is not None:
+                self._cache.move_to_end(key)
+            return embedding
+    
+    def _cache_put(self, key: Hashable, embedding: np.ndarray):
+        """Store an embedding, evicting the least recently used on overflow"""
+        embedding.setflags(write=False)  # shared between callers
+        with self._cache_lock:
+            self._cache[key] = embedding
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+    
+    @staticmethod
+    def _text_key(text: str) -> Hashable:
+        return ('text', _digest(text.encode('utf-8')))
+    
+    @staticmethod
+    def _image_key(image) -> Hashable:
+        # Hash decoded pixels so the same image hits regardless of container format
+        rgb = image.convert('RGB')
+        return ('image', rgb.size, _digest(rgb.tobytes()))
     
     def embed_text(self, text: str) -> np.ndarray:
         """Generate text embeddings"""
-        embedding = self.text_model.encode(text, convert_to_numpy=True)
+        if not self.cache_enabled:
+            return self.text_model.encode(text, convert_to_numpy=True)
+        
+        key = self._text_key(text)
+        embedding = self._cache_get(key)
+        if embedding is None:
+            embedding = self.text_model.encode(text, convert_to_numpy=True)
+            self._cache_put(key, embedding)
         return embedding
     
-    def embed_texts(self, texts: List[str]) -> np.ndarray:
+    def embed_texts(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
         """Batch embed multiple texts"""
-        embeddings = self.text_model.encode(texts, convert_to_numpy=True)
+        return self._embed_cached(texts, self._text_key, self._encode_texts, batch_size)
+    
+    def _embed_cached(self, items: list, key_fn: Callable, encode_fn: Callable, batch_size: int) -> np.ndarray:
+        """Embed a batch, encoding only the distinct items missing from the cache"""
+        if not self.cache_enabled or not items:
+            return encode_fn(items, batch_size)
+        
+        keys = [key_fn(item) for item in items]
+        cached = [self._cache_get(key) for key in keys]
+        
+        # Encode each distinct uncached item once
+        missing = {}
+        for key, item, embedding in zip(keys, items, cached):
+            if embedding is None:
+                missing.setdefault(key, item)
+        fresh = {}
+        if missing:
+            encoded = encode_fn(list(missing.values()), batch_size)
+            for key, embedding in zip(missing, encoded):
+                # Copy the row so cached entries don't pin the whole batch matrix
+                embedding = embedding.copy()
+                self._cache_put(key, embedding)
+                fresh[key] = embedding
+        
+        return np.stack([
+            embedding if embedding is not None else fresh[key]
+            for key, embedding in zip(keys, cached)
+        ])
+    
+    def _encode_texts(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """Run the text model over a batch"""
+        embeddings = self.text_model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
         return embeddings
     
     def embed_image(self, image) -> np.ndarray:
         """Generate image embeddings using CLIP"""
-        inputs = self.vision_processor(images=image, return_tensors="pt")
-        with torch.no_grad():
-            image_features = self.vision_model.get_image_features(**inputs)
-        return image_features.numpy().flatten()
+        return self.embed_images([image], batch_size=1)[0]
+    
+    def embed_images(self, images: list, batch_size: int = 32) -> np.ndarray:
+        """Batch embed multiple images with CLIP, returning a (B, 512) matrix"""
+        return self._embed_cached(images, self._image_key, self._encode_images, batch_size)
+    
+    def _preprocess_image(self, image) -> torch.Tensor:
+        """Resize and normalize one image into a (1, 3, 224, 224) tensor"""
+        return self.vision_processor(images=image, return_tensors="pt")['pixel_values']
+    
+    def _encode_images(self, images: list, batch_size: int) -> np.ndarray:
+        """Run CLIP's vision tower over a batch"""
+        if not images:
+            return np.empty((0, self.vision_model.config.projection_dim), dtype=np.float32)
+        
+        # Preprocessing dominates and PIL releases the GIL, so spread it over threads
+        if len(images) > 1:
+            with ThreadPoolExecutor() as executor:
+                pixel_values = list(executor.map(self._preprocess_image, images))
+        else:
+            pixel_values = [self._preprocess_image(images[0])]
+        
+        outputs = []
+        for i in range(0, len(pixel_values), batch_size):
+            batch = torch.cat(pixel_values[i:i + batch_size]).to(self.device, dtype=self.vision_dtype)
+            with torch.inference_mode():
+                image_features = self.vision_model.get_image_features(pixel_values=batch)
+            outputs.append(image_features.float().cpu().numpy())
+        return np.concatenate(outputs)
+    
+    def embed_clip_texts(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Embed texts with CLIP's text tower, into the same 512-d space as images"""
+        return self._embed_cached(texts, self._clip_text_key, self._encode_clip_texts, batch_size)
+    
+    @staticmethod
+    def _clip_text_key(text: str) -> Hashable:
+        return ('clip_text', _digest(text.encode('utf-8')))
+    
+    def _encode_clip_texts(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """Run CLIP's text tower over a batch"""
+        if not texts:
+            return np.empty((0, self.vision_model.config.projection_dim), dtype=np.float32)
+        
+        outputs = []
+        for i in range(0, len(texts), batch_size):
+            inputs = self.vision_processor(
+                text=texts[i:i + batch_size], return_tensors="pt", padding=True, truncation=True
+            )
+            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            with torch.inference_mode():
+                text_features = self.vision_model.get_text_features(**inputs)
+            outputs.append(text_features.float().cpu().numpy())
+        return np.concatenate(outputs)
     
     def embed_table(self, table_text: str) -> np.ndarray:
         """Generate table embeddings (treated as structured text)"""
         # Tables are embedded as text but can be weighted differently
         return self.embed_text(table_text)
+
+@lru_cache(maxsize=1)
+def get_embedder() -> MultiModalEmbedder:
+    """Process-wide embedder, so every vector store shares one copy of the models"""
+    return MultiModalEmbedder()
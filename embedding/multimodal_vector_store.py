@@ -1,174 +1,565 @@
 import faiss
 import numpy as np
+import json
+import os
 import pickle
+import time
 import uuid
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 
 class MultiModalVectorStore:
     """Vector store using FAISS - works on Windows without build tools"""
     
-    def __init__(self, collection_name: str = "multimodal_docs", persist_directory: str = "./vector_db"):
+    # HNSW graph parameters used once the corpus outgrows exact search
+    HNSW_M = 32
+    HNSW_EF_CONSTRUCTION = 40
+    HNSW_EF_SEARCH = 16
+    
+    # Cosine of weakly and strongly related pairs for each model. CLIP text-image
+    # similarities sit far lower than MiniLM text-text ones, so image scores are
+    # mapped linearly from their band onto the text band; every result score, the
+    # hybrid blend and source confidence then share MiniLM's scale. Image hits
+    # below the band's lower edge are treated as unrelated and dropped.
+    TEXT_SIMILARITY_BAND = (0.4, 0.8)
+    IMAGE_SIMILARITY_BAND = (0.25, 0.35)
+    
+    # Persisted files per collection; .index goes last when renaming, since exists() keys on it
+    FILE_SUFFIXES = ('.pkl', '.ids', '.jsonl', '.image.index', '.index')
+    
+    # Collections still being built carry this suffix and are not listed
+    PARTIAL_SUFFIX = '.partial'
+    
+    @classmethod
+    def partial_name(cls, collection_name: str) -> str:
+        """Unique name to build a collection under before renaming it into place"""
+        return f"{collection_name}.{uuid.uuid4().hex}{cls.PARTIAL_SUFFIX}"
+    
+    @classmethod
+    def sweep_partials(cls, persist_directory: str = "./vector_db", max_age: float = 24 * 3600):
+        """Delete files of partial builds untouched for max_age seconds (abandoned or crashed)"""
+        directory = Path(persist_directory)
+        if not directory.exists():
+            return
+        cutoff = time.time() - max_age
+        for path in directory.glob(f"*{cls.PARTIAL_SUFFIX}.*"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+    
+    def __init__(self, collection_name: str = "multimodal_docs", persist_directory: str = "./vector_db",
+                 index_type: str = "auto", hnsw_threshold: int = 5000, embedder=None):
+        """
+        Args:
+            index_type: 'flat' for exact search, 'hnsw' for approximate search, or
+                'auto' to start flat and switch to HNSW at hnsw_threshold vectors.
+            hnsw_threshold: Corpus size at which 'auto' switches to HNSW.
+            embedder: MultiModalEmbedder to use; defaults to the shared get_embedder().
+        """
+        if index_type not in ('flat', 'hnsw', 'auto'):
+            raise ValueError(f"Unknown index_type: {index_type}")
+        
         self.collection_name = collection_name
         self.persist_directory = Path(persist_directory)
         self.persist_directory.mkdir(exist_ok=True)
         
-        # Initialize FAISS index (384 dimensions for all-MiniLM-L6-v2)
+        # Initialize FAISS index (384 dimensions for all-MiniLM-L6-v2); vectors are
+        # unit-normalized, so inner product is cosine similarity
         self.dimension = 384
-        self.index = faiss.IndexFlatL2(self.dimension)
+        self.index_type = index_type
+        self.hnsw_threshold = hnsw_threshold
+        self.index = self._new_index('hnsw' if index_type == 'hnsw' else 'flat')
+        
+        # Separate CLIP index (512 dimensions) for image chunks; each row maps
+        # to a position in self.documents via image_doc_idx
+        self.image_dimension = 512
+        self.image_index = faiss.IndexFlatIP(self.image_dimension)
+        self.image_doc_idx = []
         
         # Storage for documents and metadata
         self.documents = []
         self.metadatas = []
         self.ids = []
         
+        # Lowercased term sets per document, built at ingestion for hybrid search
+        self.doc_terms = []
+        
+        # Number of documents already written to disk; later ones are appended by save()
+        self._saved_count = 0
+        
         # Initialize embedder
-        from embedding.multimodal_embedder import MultiModalEmbedder
-        self.embedder = MultiModalEmbedder()
+        if embedder is None:
+            from embedding.multimodal_embedder import get_embedder
+            embedder = get_embedder()
+        self.embedder = embedder
         
-        # Try to load existing index
+        # Try to load existing index; load_error records why persisted files were not used
+        self.load_error = None
         self._load_index()
     
-    def add_documents(self, chunks: List[Dict[str, Any]]):
-        """Add document chunks to vector store"""
-        if not chunks:
+    def _new_index(self, kind: str):
+        """Create an empty FAISS index of the given kind"""
+        if kind == 'hnsw':
+            index = faiss.IndexHNSWFlat(self.dimension, self.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = self.HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = self.HNSW_EF_SEARCH
+            return index
+        return faiss.IndexFlatIP(self.dimension)
+    
+    def _maybe_upgrade_index(self, incoming: int):
+        """Rebuild a flat index as HNSW once 'auto' crosses the size threshold"""
+        if self.index_type != 'auto' or not isinstance(self.index, faiss.IndexFlat):
+            return
+        if self.index.ntotal + incoming < self.hnsw_threshold:
             return
         
-        embeddings = []
+        hnsw = self._new_index('hnsw')
+        if self.index.ntotal:
+            hnsw.add(self.index.reconstruct_n(0, self.index.ntotal))
+        self.index = hnsw
+    
+    @staticmethod
+    def _normalized(vectors) -> np.ndarray:
+        """Unit-normalize the rows of a float32 matrix
+
+        Fresh encoder output is normalized in place; anything else (other dtypes,
+        read-only cache entries, lists) is copied into a new matrix first.
+        """
+        vectors = np.require(vectors, dtype='float32', requirements=['C_CONTIGUOUS', 'WRITEABLE'])
+        faiss.normalize_L2(vectors)
+        return vectors
+    
+    @classmethod
+    def exists(cls, collection_name: str, persist_directory: str = "./vector_db") -> bool:
+        """Check whether a collection has been persisted to disk"""
+        directory = Path(persist_directory)
+        if not (directory / f"{collection_name}.index").exists():
+            return False
+        # .pkl is the pre-JSONL metadata format, migrated on first load
+        return (directory / f"{collection_name}.jsonl").exists() or (directory / f"{collection_name}.pkl").exists()
+    
+    @classmethod
+    def list_collections(cls, persist_directory: str = "./vector_db") -> List[str]:
+        """Names of all collections persisted to disk"""
+        directory = Path(persist_directory)
+        if not directory.exists():
+            return []
+        return sorted(
+            p.stem for p in directory.glob("*.index")
+            if not p.stem.endswith(cls.PARTIAL_SUFFIX) and cls.exists(p.stem, persist_directory)
+        )
+    
+    @classmethod
+    def index_version(cls, collection_name: str, persist_directory: str = "./vector_db") -> int:
+        """Modification time of a collection's index (0 if absent); changes whenever it is rebuilt"""
+        try:
+            return (Path(persist_directory) / f"{collection_name}.index").stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+    
+    @classmethod
+    def delete(cls, collection_name: str, persist_directory: str = "./vector_db"):
+        """Remove a collection's files without touching any store that has it loaded"""
+        for suffix in cls.FILE_SUFFIXES:
+            path = Path(persist_directory) / f"{collection_name}{suffix}"
+            if path.exists():
+                path.unlink()
+    
+    def _path(self, suffix: str) -> Path:
+        """Path of one of this collection's persisted files"""
+        return self.persist_directory / f"{self.collection_name}{suffix}"
+    
+    def add_documents(self, chunks: List[Dict[str, Any]], persist: bool = True):
+        """Add document chunks to vector store; with persist=False, call save() once done"""
+        if not chunks:
+            return
         
+        # First pass: collect what to embed for each supported chunk
+        texts_to_embed = []
+        contents = []
+        metadatas = []
+        images = []
         for chunk in chunks:
-            chunk_id = str(uuid.uuid4())
-            
-            # Generate embedding based on type
             if chunk['type'] in ['text', 'table']:
-                embedding = self.embedder.embed_text(chunk['content'])
+                texts_to_embed.append(chunk['content'])
             elif chunk['type'] == 'image':
                 # For images, embed the OCR text or description
-                embedding = self.embedder.embed_text(chunk.get('ocr_text', ''))
+                texts_to_embed.append(chunk.get('ocr_text', ''))
             else:
                 continue
             
-            embeddings.append(embedding)
-            self.ids.append(chunk_id)
-            self.documents.append(chunk['content'])
-            self.metadatas.append({
+            contents.append(chunk['content'])
+            images.append(chunk.get('image') if chunk['type'] == 'image' else None)
+            metadatas.append({
                 'type': chunk['type'],
                 'page': chunk.get('page', 0),
                 'source': chunk.get('source', 'unknown')
             })
         
-        # Convert to numpy array and add to FAISS index
-        if embeddings:
-            embeddings_array = np.array(embeddings).astype('float32')
-            self.index.add(embeddings_array)
-            
-            # Save index after adding
-            self._save_index()
+        # Second pass: one batched encode for every chunk
+        if texts_to_embed:
+            self._append(self.embedder.embed_texts(texts_to_embed), contents, metadatas, images, persist)
+    
+    def add_arrays(self, contents: List[str], pages: List[int], types: List[str],
+                   extra_meta: Optional[List[Dict[str, Any]]] = None, images: Optional[List[Any]] = None,
+                   persist: bool = True):
+        """Add column-oriented chunks with a single batched encode
+
+        images, if given, holds the PIL image for each 'image' chunk (None elsewhere);
+        those are also embedded with CLIP into the image index. Bulk loads should
+        pass persist=False for every batch and call save() after the last one, so
+        the FAISS indexes are written once instead of once per batch.
+        """
+        if not contents:
+            return
+        if extra_meta is None:
+            extra_meta = [{}] * len(contents)
+        
+        metadatas = [
+            {
+                'type': chunk_type,
+                'page': page,
+                'source': extra.get('source', 'unknown')
+            }
+            for page, chunk_type, extra in zip(pages, types, extra_meta)
+        ]
+        self._append(self.embedder.embed_texts(contents), contents, metadatas, images, persist)
+    
+    def _append(self, embeddings: np.ndarray, contents: List[str], metadatas: List[Dict[str, Any]],
+                images: Optional[List[Any]] = None, persist: bool = True):
+        """Add an (N, dimension) embedding matrix and its documents, then optionally persist"""
+        self._maybe_upgrade_index(len(contents))
+        
+        # Image chunks additionally go into the CLIP index, unit-normalized for cosine
+        if images:
+            base = len(self.documents)
+            positions = [base + i for i, image in enumerate(images) if image is not None]
+            if positions:
+                self.image_index.add(self._normalized(
+                    self.embedder.embed_images([images[pos - base] for pos in positions])
+                ))
+                self.image_doc_idx.extend(positions)
+        
+        self.index.add(self._normalized(embeddings))
+        
+        self.ids.extend(str(uuid.uuid4()) for _ in contents)
+        self.documents.extend(contents)
+        self.doc_terms.extend(map(self._terms, contents))
+        self.metadatas.extend(metadatas)
+        
+        if persist:
+            self.save()
+    
+    @staticmethod
+    def _terms(text: str) -> frozenset:
+        """Lowercased whitespace tokens used for keyword matching"""
+        return frozenset(text.lower().split())
+    
+    def _search(self, query: str, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Run a vector search and return (scores, indices) for one query"""
+        return self._search_batch([query], top_k)[0]
+    
+    def _search_batch(self, queries: List[str], top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Search every modality for a batch of queries; one (scores, indices) pair per query"""
+        # A single multi-row search lets FAISS parallelize across queries
+        query_array = self._normalized(self.embedder.embed_texts(queries))
+        all_scores, all_indices = self.index.search(query_array, min(top_k, self.index.ntotal))
+        text_hits = [self._valid_hits(s, i) for s, i in zip(all_scores, all_indices)]
+        
+        if self.image_index.ntotal == 0:
+            return text_hits
+        
+        # Query the image index through CLIP's text tower for cross-modal matches
+        clip_array = self._normalized(self.embedder.embed_clip_texts(queries))
+        all_sims, all_rows = self.image_index.search(clip_array, min(top_k, self.image_index.ntotal))
+        image_doc_idx = np.asarray(self.image_doc_idx, dtype='int64')
+        
+        fused = []
+        for hits, sims, rows in zip(text_hits, all_sims, all_rows):
+            keep = (rows >= 0) & (sims >= self.IMAGE_SIMILARITY_BAND[0])
+            image_hits = (self._calibrate_image_scores(sims[keep]), image_doc_idx[rows[keep]])
+            fused.append(self._fuse(hits, image_hits, top_k))
+        return fused
+    
+    @classmethod
+    def _calibrate_image_scores(cls, sims: np.ndarray) -> np.ndarray:
+        """Map CLIP text-image cosines onto the MiniLM text similarity scale"""
+        (image_lo, image_hi), (text_lo, text_hi) = cls.IMAGE_SIMILARITY_BAND, cls.TEXT_SIMILARITY_BAND
+        scaled = text_lo + (sims - image_lo) * ((text_hi - text_lo) / (image_hi - image_lo))
+        return np.clip(scaled, -1.0, 1.0).astype('float32')
+    
+    @staticmethod
+    def _fuse(text_hits: Tuple[np.ndarray, np.ndarray], image_hits: Tuple[np.ndarray, np.ndarray],
+              top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Merge per-modality hits scored on one scale, keeping each document's best score"""
+        best = {}
+        for scores, indices in (text_hits, image_hits):
+            for score, idx in zip(scores, indices):
+                if idx not in best or score > best[idx]:
+                    best[idx] = score
+        
+        # Stable sort, so text hits win ties
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        scores = np.array([score for _, score in ranked], dtype='float32')
+        indices = np.array([idx for idx, _ in ranked], dtype='int64')
+        return scores, indices
+    
+    def _valid_hits(self, scores: np.ndarray, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Drop FAISS padding (-1) and ids outside the document store"""
+        valid = (indices >= 0) & (indices < len(self.documents))
+        return scores[valid], indices[valid]
+    
+    def _result(self, idx: int, score: float) -> Dict[str, Any]:
+        """Format a stored document as a search result; score is cosine similarity"""
+        return {
+            'id': self.ids[idx],
+            'content': self.documents[idx],
+            'metadata': self.metadatas[idx],
+            'score': float(score)
+        }
     
     def retrieve(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Retrieve relevant chunks for a query"""
         if self.index.ntotal == 0:
             return []
         
-        # Generate query embedding
-        query_embedding = self.embedder.embed_text(query)
-        query_array = np.array([query_embedding]).astype('float32')
-        
-        # Search in FAISS index
-        distances, indices = self.index.search(query_array, min(top_k, self.index.ntotal))
-        
-        # Format results
-        retrieved_docs = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.documents):  # Valid index
-                retrieved_docs.append({
-                    'id': self.ids[idx],
-                    'content': self.documents[idx],
-                    'metadata': self.metadatas[idx],
-                    'distance': float(distances[0][i])
-                })
+        scores, indices = self._search(query, top_k)
+        return [self._result(idx, score) for score, idx in zip(scores, indices)]
+    
+    def retrieve_batch(self, queries: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        """Retrieve relevant chunks for several queries at once"""
+        if self.index.ntotal == 0 or not queries:
+            return [[] for _ in queries]
         
-        return retrieved_docs
+        return [
+            [self._result(idx, score) for score, idx in zip(scores, indices)]
+            for scores, indices in self._search_batch(queries, top_k)
+        ]
     
-    def hybrid_search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Hybrid search combining vector and keyword matching"""
-        # Vector search
-        vector_results = self.retrieve(query, top_k=top_k * 2)
+    def hybrid_search(self, query: str, top_k: int = 5,
+                      query_terms: Optional[frozenset] = None) -> List[Dict[str, Any]]:
+        """Hybrid search combining vector and keyword matching
         
-        if not vector_results:
+        query_terms may be passed by callers that already tokenized the query.
+        """
+        if self.index.ntotal == 0:
             return []
         
-        # Simple keyword filtering
-        query_terms = set(query.lower().split())
+        if query_terms is None:
+            query_terms = self._terms(query)
         
-        # Score results
-        for result in vector_results:
-            content_terms = set(result['content'].lower().split())
-            keyword_overlap = len(query_terms & content_terms) / len(query_terms) if query_terms else 0
-            
-            # Combine scores (adjust weights as needed)
-            # Lower distance is better, so we invert it
-            vector_score = 1.0 / (1.0 + result['distance'])
-            result['hybrid_score'] = (
-                0.7 * vector_score +      # Vector similarity
-                0.3 * keyword_overlap     # Keyword overlap
+        # Vector search
+        scores, indices = self._search(query, top_k * 2)
+        return self._rank_hybrid(query_terms, scores, indices, top_k)
+    
+    def hybrid_search_batch(self, queries: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        """Hybrid search for several queries with one batched vector search"""
+        if self.index.ntotal == 0 or not queries:
+            return [[] for _ in queries]
+        
+        return [
+            self._rank_hybrid(self._terms(query), scores, indices, top_k)
+            for query, (scores, indices) in zip(queries, self._search_batch(queries, top_k * 2))
+        ]
+    
+    def _rank_hybrid(self, query_terms: frozenset, scores: np.ndarray, indices: np.ndarray,
+                     top_k: int) -> List[Dict[str, Any]]:
+        """Re-rank vector hits by blending in keyword overlap"""
+        # Simple keyword filtering against the term sets cached at ingestion
+        if query_terms:
+            overlap = np.fromiter(
+                (len(query_terms & self.doc_terms[idx]) for idx in indices),
+                dtype=np.float64, count=len(indices)
             )
+            keyword_overlap = overlap / len(query_terms)
+        else:
+            keyword_overlap = np.zeros(len(indices))
+        
+        # Combine scores (adjust weights as needed)
+        vector_score = scores.astype(np.float64)
+        hybrid_scores = (
+            0.7 * vector_score +      # Vector similarity
+            0.3 * keyword_overlap     # Keyword overlap
+        )
         
-        # Sort by hybrid score and return top_k
-        vector_results.sort(key=lambda x: x['hybrid_score'], reverse=True)
-        return vector_results[:top_k]
+        # Select top_k in linear time, then sort only those; stable so ties keep vector order
+        if top_k < len(hybrid_scores):
+            order = np.sort(np.argpartition(-hybrid_scores, top_k - 1)[:top_k])
+        else:
+            order = np.arange(len(hybrid_scores))
+        order = order[np.argsort(-hybrid_scores[order], kind='stable')]
+        results = []
+        for i in order:
+            result = self._result(indices[i], scores[i])
+            result['hybrid_score'] = float(hybrid_scores[i])
+            results.append(result)
+        return results
     
-    def _save_index(self):
-        """Save FAISS index and metadata to disk"""
+    def save(self):
+        """Save FAISS indexes, then append documents added since the last save"""
         try:
-            # Save FAISS index
-            index_path = self.persist_directory / f"{self.collection_name}.index"
-            faiss.write_index(self.index, str(index_path))
+            # Save FAISS indexes
+            self._write_index(self.index, '.index')
+            self._write_index(self.image_index, '.image.index')
             
             # Save metadata
-            metadata_path = self.persist_directory / f"{self.collection_name}.pkl"
-            with open(metadata_path, 'wb') as f:
-                pickle.dump({
-                    'documents': self.documents,
-                    'metadatas': self.metadatas,
-                    'ids': self.ids
-                }, f)
+            self._save_metadata(self._saved_count)
+            self._saved_count = len(self.documents)
         except Exception as e:
             print(f"Warning: Could not save index: {e}")
     
+    def _save_metadata(self, start: int = 0):
+        """Persist documents from position start onwards
+
+        Documents go to an append-only JSON-lines file and ids to a packed file of
+        16-byte UUIDs, so adding a batch never rewrites earlier records. start=0
+        rewrites both files from scratch.
+        """
+        image_positions = set(self.image_doc_idx)
+        mode = 'a' if start else 'w'
+        with open(self._path('.jsonl'), mode, encoding='utf-8') as f:
+            for pos in range(start, len(self.documents)):
+                f.write(json.dumps({
+                    'content': self.documents[pos],
+                    'metadata': self.metadatas[pos],
+                    'terms': sorted(self.doc_terms[pos]),
+                    'image': pos in image_positions
+                }) + '\n')
+        with open(self._path('.ids'), mode + 'b') as f:
+            f.write(b''.join(uuid.UUID(chunk_id).bytes for chunk_id in self.ids[start:]))
+    
+    def _write_index(self, index, suffix: str):
+        """Write a FAISS index via a temp file, so a crash mid-write never leaves a truncated index"""
+        path = self._path(suffix)
+        tmp_path = path.with_name(path.name + '.tmp')
+        faiss.write_index(index, str(tmp_path))
+        os.replace(tmp_path, path)
+    
+    def _read_index(self, suffix: str):
+        """Read one of this collection's FAISS indexes"""
+        return faiss.read_index(str(self._path(suffix)))
+    
     def _load_index(self):
-        """Load FAISS index and metadata from disk"""
+        """Load FAISS index and metadata from disk
+        
+        Everything is read and cross-checked before any attribute is set, so a
+        missing or inconsistent file leaves the store empty rather than half-loaded.
+        """
         try:
-            index_path = self.persist_directory / f"{self.collection_name}.index"
-            metadata_path = self.persist_directory / f"{self.collection_name}.pkl"
+            if not self._path('.index').exists():
+                return
             
-            if index_path.exists() and metadata_path.exists():
-                # Load FAISS index
-                self.index = faiss.read_index(str(index_path))
-                
-                # Load metadata
-                with open(metadata_path, 'rb') as f:
-                    data = pickle.load(f)
-                    self.documents = data['documents']
-                    self.metadatas = data['metadatas']
-                    self.ids = data['ids']
-                
-                print(f"✅ Loaded existing index with {self.index.ntotal} vectors")
+            legacy = False
+            if self._path('.jsonl').exists():
+                metadata = self._read_metadata()
+            elif self._path('.pkl').exists():
+                metadata = self._read_legacy_metadata()
+                legacy = True
+            else:
+                return
+            documents, metadatas, ids, doc_terms, image_doc_idx = metadata
+            
+            # Load FAISS indexes
+            index = self._read_index('.index')
+            if self._path('.image.index').exists():
+                image_index = self._read_index('.image.index')
+            else:
+                image_index = faiss.IndexFlatIP(self.image_dimension)
+            
+            if not (len(documents) == len(metadatas) == len(ids) == len(doc_terms) == index.ntotal):
+                raise ValueError(
+                    f"{len(documents)} documents and {len(ids)} ids for {index.ntotal} vectors"
+                )
+            if len(image_doc_idx) != image_index.ntotal:
+                raise ValueError(f"{len(image_doc_idx)} image documents for {image_index.ntotal} image vectors")
+            
+            self.documents = documents
+            self.metadatas = metadatas
+            self.ids = ids
+            self.doc_terms = doc_terms
+            self.image_doc_idx = image_doc_idx
+            self.index = index
+            self.image_index = image_index
+            self._saved_count = len(documents)
+            
+            if legacy:
+                self._save_metadata()
+            if self.index.metric_type != faiss.METRIC_INNER_PRODUCT:
+                self._migrate_l2_index()
+            if isinstance(self.index, faiss.IndexHNSW):
+                self.index.hnsw.efSearch = self.HNSW_EF_SEARCH
+            
+            print(f"✅ Loaded existing index with {self.index.ntotal} vectors")
         except Exception as e:
+            self.load_error = str(e)
             print(f"No existing index found or error loading: {e}")
     
+    def _read_metadata(self):
+        """Read documents from the JSON-lines file and ids from the packed .ids file"""
+        with open(self._path('.jsonl'), encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        packed_ids = np.fromfile(self._path('.ids'), dtype=np.uint8).reshape(-1, 16)
+        return (
+            [record['content'] for record in records],
+            [record['metadata'] for record in records],
+            [str(uuid.UUID(bytes=row.tobytes())) for row in packed_ids],
+            [frozenset(record['terms']) for record in records],
+            [pos for pos, record in enumerate(records) if record['image']],
+        )
+    
+    def _migrate_l2_index(self):
+        """Rebuild an index saved with the old L2 metric as a normalized inner-product index"""
+        vectors = self._normalized(self.index.reconstruct_n(0, self.index.ntotal))
+        self.index = self._new_index('hnsw' if isinstance(self.index, faiss.IndexHNSW) else 'flat')
+        self.index.add(vectors)
+        self._write_index(self.index, '.index')
+    
+    def _read_legacy_metadata(self):
+        """Read metadata from the old pickle format; _load_index rewrites it as JSON lines"""
+        with open(self._path('.pkl'), 'rb') as f:
+            data = pickle.load(f)
+        documents = data['documents']
+        return (
+            documents,
+            data['metadatas'],
+            data['ids'],
+            data.get('doc_terms') or [self._terms(doc) for doc in documents],
+            data.get('image_doc_idx', []),
+        )
+    
     def clear(self):
-        """Clear the vector store"""
-        self.index = faiss.IndexFlatL2(self.dimension)
+        """Clear the vector store and remove its persisted files"""
+        self.index = self._new_index('hnsw' if self.index_type == 'hnsw' else 'flat')
         self.documents = []
         self.metadatas = []
         self.ids = []
-        self._save_index()
+        self.doc_terms = []
+        self.image_index = faiss.IndexFlatIP(self.image_dimension)
+        self.image_doc_idx = []
+        self._saved_count = 0
+        self.delete(self.collection_name, self.persist_directory)
+    
+    def rename(self, collection_name: str):
+        """Move this collection's files to a new name, replacing any collection already there"""
+        target = self.persist_directory / f"{collection_name}.index"
+        if target.exists():
+            target.unlink()
+        for suffix in self.FILE_SUFFIXES:
+            path = self._path(suffix)
+            target = self.persist_directory / f"{collection_name}{suffix}"
+            if path.exists():
+                os.replace(path, target)
+            elif target.exists():
+                target.unlink()
+        self.collection_name = collection_name
     
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics about the vector store"""
         return {
             'total_vectors': self.index.ntotal,
+            'image_vectors': self.image_index.ntotal,
             'total_documents': len(self.documents),
             'dimension': self.dimension,
             'collection_name': self.collection_name
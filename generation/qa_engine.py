@@ -1,8 +1,42 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from functools import lru_cache
+import asyncio
+import re
 import time
 import logging
 import os
 
+try:
+    from anthropic import Anthropic, AsyncAnthropic
+except ImportError:
+    Anthropic = None
+    AsyncAnthropic = None
+
+# Model and answer length used for every LLM request, streaming or async
+ANSWER_MODEL = "claude-sonnet-4-20250514"
+ANSWER_MAX_TOKENS = 1000
+
+# The question prompt is assembled around the context and query with str.join
+PROMPT_HEADER = """Based on the following context from a document, please answer the user's question directly and concisely.
+
+Context from the document:
+"""
+PROMPT_MID = """
+
+User's question: """
+PROMPT_TAIL = """
+
+Please provide a clear, direct answer based solely on the information in the context above. If the context doesn't contain enough information to answer the question, say so. Cite specific pages when relevant."""
+
+# Sentence boundaries: terminal punctuation followed by whitespace, so "2.8%" stays whole
+_SENT_RE = re.compile(r'(?<=[.!?])\s+')
+
+@lru_cache(maxsize=4096)
+def _split_sentences(content: str, limit: int = 10) -> Tuple[Tuple[str, ...], Tuple[frozenset, ...]]:
+    """First sentences of a document and their term sets, computed once per document"""
+    sentences = tuple(s.strip() for s in _SENT_RE.split(content, maxsplit=limit)[:limit])
+    return sentences, tuple(frozenset(s.rstrip('.!?').lower().split()) for s in sentences)
+
 class QAEngine:
     """
     Generates answers using retrieved context from a vector store.
@@ -23,7 +57,42 @@ class QAEngine:
         self.api_key = api_key or os.environ.get('ANTHROPIC_API_KEY')
         self.use_llm = self.api_key is not None
 
-    def generate_answer(self, query: str, use_hybrid: bool = True, top_k: int = 5) -> Dict[str, Any]:
+        # Context below the minimum isn't worth an API call; above the cap it is truncated
+        self._min_ctx_chars = 300
+        self._max_ctx_chars = 6000
+
+        # One client per engine so its HTTP connection pool is reused across questions
+        self._anthropic_client = None
+        if self.use_llm:
+            if Anthropic is None:
+                self.logger.warning("Anthropic library not installed. Using fallback.")
+                self.use_llm = False
+            else:
+                self._anthropic_client = Anthropic(api_key=self.api_key)
+
+    def retrieve_batch(self, queries: List[str], use_hybrid: bool = True, top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve context documents for several queries with one batched search.
+
+        Args:
+            queries (List[str]): The user query strings.
+            use_hybrid (bool, optional): Whether to use hybrid search. Defaults to True.
+            top_k (int, optional): Number of top documents to retrieve per query. Defaults to 5.
+
+        Returns:
+            List[List[Dict[str, Any]]]: Retrieved documents for each query, in order.
+        """
+        try:
+            if use_hybrid:
+                return self.vector_store.hybrid_search_batch(queries, top_k=top_k)
+            return self.vector_store.retrieve_batch(queries, top_k=top_k)
+        except Exception as e:
+            self.logger.error(f"Error during batched document retrieval: {e}")
+            return [[] for _ in queries]
+
+    def generate_answer(self, query: str, use_hybrid: bool = True, top_k: int = 5,
+                        retrieved: Optional[List[Dict[str, Any]]] = None,
+                        on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """
         Generate an answer with citations using the retrieved context.
 
@@ -31,44 +100,45 @@ class QAEngine:
             query (str): The user query string.
             use_hybrid (bool, optional): Whether to use hybrid search. Defaults to True.
             top_k (int, optional): Number of top documents to retrieve. Defaults to 5.
+            retrieved (List[Dict[str, Any]], optional): Documents already retrieved for
+                this query (e.g. by retrieve_batch). Skips retrieval when given.
+            on_token (Callable[[str], None], optional): Called with each piece of the
+                LLM answer as it streams in.
 
         Returns:
             Dict[str, Any]: Dictionary with answer, sources, context, and timings.
         """
         start_time = time.time()
 
-        try:
-            # Retrieve relevant context documents
-            if use_hybrid:
-                retrieved = self.vector_store.hybrid_search(query, top_k=top_k)
-            else:
-                retrieved = self.vector_store.retrieve(query, top_k=top_k)
-        except Exception as e:
-            self.logger.error(f"Error during document retrieval: {e}")
-            retrieved = []
+        # Tokenize once for keyword re-ranking and the fallback answer
+        query_terms = frozenset(query.lower().split())
+
+        if retrieved is None:
+            try:
+                # Retrieve relevant context documents
+                if use_hybrid:
+                    retrieved = self.vector_store.hybrid_search(query, top_k=top_k, query_terms=query_terms)
+                else:
+                    retrieved = self.vector_store.retrieve(query, top_k=top_k)
+            except Exception as e:
+                self.logger.error(f"Error during document retrieval: {e}")
+                retrieved = []
 
         retrieval_time = time.time() - start_time
 
         if not retrieved:
             self.logger.warning("No documents retrieved for the query.")
-            return {
-                'answer': "I couldn't find any relevant information in the document to answer your question. Please try rephrasing or asking about a different topic.",
-                'sources': [],
-                'context': "",
-                'retrieval_time_ms': int(retrieval_time * 1000),
-                'generation_time_ms': 0
-            }
+            return self._empty_result(retrieval_time)
 
-        context = self._build_context(retrieved)
-        sources = self._extract_sources(retrieved)
+        context, sources = self._build_context_and_sources(retrieved)
 
         generation_start = time.time()
         
         # Generate answer using LLM if available, otherwise use smart fallback
         if self.use_llm:
-            answer = self._generate_with_anthropic(query, context)
+            answer = self._generate_with_anthropic(query, context, retrieved, on_token=on_token)
         else:
-            answer = self._generate_smart_fallback(query, retrieved)
+            answer = self._generate_smart_fallback(query, retrieved, query_terms=query_terms)
             
         generation_time = time.time() - generation_start
 
@@ -80,65 +150,142 @@ class QAEngine:
             'generation_time_ms': int(generation_time * 1000)
         }
 
-    def _build_context(self, retrieved_docs: List[Dict[str, Any]]) -> str:
-        """Build a concatenated context string from retrieved documents."""
+    async def generate_answers_async(self, queries: List[str], retrieved_batch: List[List[Dict[str, Any]]],
+                                     max_concurrency: int = 16) -> List[Dict[str, Any]]:
+        """
+        Generate answers for several already-retrieved queries, running the LLM calls concurrently.
+
+        Args:
+            queries (List[str]): The user query strings.
+            retrieved_batch (List[List[Dict[str, Any]]]): Retrieved documents for each query,
+                e.g. from retrieve_batch.
+            max_concurrency (int, optional): Most API requests in flight at once. Defaults to 16.
+
+        Returns:
+            List[Dict[str, Any]]: One generate_answer-style result per query, in order.
+        """
+        if not self.use_llm or AsyncAnthropic is None:
+            return [self.generate_answer(query, retrieved=retrieved)
+                    for query, retrieved in zip(queries, retrieved_batch)]
+
+        # The async client's connections belong to the running event loop, so it lives for this call only
+        semaphore = asyncio.Semaphore(max_concurrency)
+        async with AsyncAnthropic(api_key=self.api_key) as client:
+            return await asyncio.gather(*(
+                self._generate_answer_async(client, semaphore, query, retrieved)
+                for query, retrieved in zip(queries, retrieved_batch)
+            ))
+
+    async def _generate_answer_async(self, client, semaphore: asyncio.Semaphore, query: str,
+                                     retrieved: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Async counterpart of generate_answer for documents that are already retrieved."""
+        if not retrieved:
+            return self._empty_result(0)
+
+        context, sources = self._build_context_and_sources(retrieved)
+
+        async with semaphore:
+            generation_start = time.time()
+            answer = await self._generate_async(client, query, context, retrieved)
+            generation_time = time.time() - generation_start
+
+        return {
+            'answer': answer,
+            'sources': sources,
+            'context': context,
+            'retrieval_time_ms': 0,
+            'generation_time_ms': int(generation_time * 1000)
+        }
+
+    def _empty_result(self, retrieval_time: float) -> Dict[str, Any]:
+        """Result returned when nothing was retrieved for a query."""
+        return {
+            'answer': "I couldn't find any relevant information in the document to answer your question. Please try rephrasing or asking about a different topic.",
+            'sources': [],
+            'context': "",
+            'retrieval_time_ms': int(retrieval_time * 1000),
+            'generation_time_ms': 0
+        }
+
+    def _build_context_and_sources(self, retrieved_docs: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+        """Build the context string and source metadata in one pass over the retrieved documents."""
         context_parts = []
-        for i, doc in enumerate(retrieved_docs):
-            page = doc.get('metadata', {}).get('page', 'unknown')
-            doc_type = doc.get('metadata', {}).get('type', 'text')
-            content = doc.get('content', '')[:800]  # Increased snippet size
-            context_parts.append(f"[Document {i+1} - Page {page} - Type: {doc_type}]\n{content}")
-        return "\n\n".join(context_parts)
-
-    def _extract_sources(self, retrieved_docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Extract source metadata from retrieved documents."""
         sources = []
-        for doc in retrieved_docs:
+        for i, doc in enumerate(retrieved_docs, 1):
             metadata = doc.get('metadata', {})
-            source_info = {
+            page = metadata.get('page', 'unknown')
+            content = doc.get('content', '')
+            context_parts.append(
+                f"[Document {i} - Page {page} - Type: {metadata.get('type', 'text')}]\n{content[:800]}"  # Increased snippet size
+            )
+            sources.append({
                 'type': metadata.get('type', 'unknown'),
-                'page': metadata.get('page', 'unknown'),
-                'confidence': 1 - doc.get('distance', 0),
-                'content': (doc.get('content', '')[:300] + '...').replace('\n', ' ')
-            }
-            sources.append(source_info)
-        return sources
-
-    def _generate_with_anthropic(self, query: str, context: str) -> str:
-        """Generate answer using Anthropic Claude API."""
+                'page': page,
+                'confidence': max(doc.get('score', 0.0), 0.0),
+                'content': (content[:300] + '...').replace('\n', ' ')
+            })
+        return "\n\n".join(context_parts), sources
+
+    def _generate_with_anthropic(self, query: str, context: str,
+                                 retrieved_docs: Optional[List[Dict[str, Any]]] = None,
+                                 on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Generate answer using Anthropic Claude API, streaming tokens to on_token."""
+        prompt = self._build_prompt(query, context)
+        if prompt is None:
+            return self._generate_smart_fallback(query, retrieved_docs)
+
         try:
-            from anthropic import Anthropic
+            parts = []
+            with self._anthropic_client.messages.stream(**self._request_params(prompt)) as stream:
+                for text in stream.text_stream:
+                    parts.append(text)
+                    if on_token is not None:
+                        on_token(text)
             
-            client = Anthropic(api_key=self.api_key)
+            return ''.join(parts)
             
-            prompt = f"""Based on the following context from a document, please answer the user's question directly and concisely.
-
-Context from the document:
-{context}
+        except Exception as e:
+            return self._api_error_fallback(e, query, retrieved_docs)
 
-User's question: {query}
+    async def _generate_async(self, client, query: str, context: str,
+                              retrieved_docs: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Generate answer with an AsyncAnthropic client, without streaming."""
+        prompt = self._build_prompt(query, context)
+        if prompt is None:
+            return self._generate_smart_fallback(query, retrieved_docs)
 
-Please provide a clear, direct answer based solely on the information in the context above. If the context doesn't contain enough information to answer the question, say so. Cite specific pages when relevant."""
+        try:
+            message = await client.messages.create(**self._request_params(prompt))
+            return ''.join(block.text for block in message.content if block.type == 'text')
 
-            message = client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=1000,
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }]
-            )
-            
-            return message.content[0].text
-            
-        except ImportError:
-            self.logger.warning("Anthropic library not installed. Using fallback.")
-            return self._generate_smart_fallback(query, None)
         except Exception as e:
-            self.logger.error(f"Error calling Anthropic API: {e}")
-            return self._generate_smart_fallback(query, None)
+            return self._api_error_fallback(e, query, retrieved_docs)
+
+    def _build_prompt(self, query: str, context: str) -> Optional[str]:
+        """Build the LLM prompt, or return None when the context is too short to be worth a call."""
+        if len(context) < self._min_ctx_chars:
+            return None
+        return "".join((PROMPT_HEADER, context[:self._max_ctx_chars], PROMPT_MID, query, PROMPT_TAIL))
+
+    def _request_params(self, prompt: str) -> Dict[str, Any]:
+        """Messages API arguments shared by the streaming and async paths."""
+        return {
+            "model": ANSWER_MODEL,
+            "max_tokens": ANSWER_MAX_TOKENS,
+            "messages": [{
+                "role": "user",
+                "content": prompt
+            }]
+        }
+
+    def _api_error_fallback(self, error: Exception, query: str,
+                            retrieved_docs: Optional[List[Dict[str, Any]]]) -> str:
+        """Log a failed API call and answer with the extractive fallback instead."""
+        self.logger.error(f"Error calling Anthropic API: {error}")
+        return self._generate_smart_fallback(query, retrieved_docs)
 
-    def _generate_smart_fallback(self, query: str, retrieved_docs: List[Dict[str, Any]]) -> str:
+    def _generate_smart_fallback(self, query: str, retrieved_docs: List[Dict[str, Any]],
+                                 query_terms: Optional[frozenset] = None) -> str:
         """
         Generate a smart fallback answer by extracting the most relevant content.
         This is used when LLM API is not available.
@@ -152,19 +299,19 @@ Please provide a clear, direct answer based solely on the information in the con
         content = top_doc.get('content', '')
         
         # Extract the most relevant sentences (simple approach)
-        sentences = content.split('.')
-        relevant_sentences = []
-        query_terms = set(query.lower().split())
+        sentences, sentence_terms = _split_sentences(content)  # Look at first 10 sentences
+        if query_terms is None:
+            query_terms = frozenset(query.lower().split())
         
-        for sentence in sentences[:10]:  # Look at first 10 sentences
-            sentence_terms = set(sentence.lower().split())
-            overlap = len(query_terms & sentence_terms)
-            if overlap > 0:
-                relevant_sentences.append(sentence.strip())
+        relevant_sentences = [
+            sentence for sentence, terms in zip(sentences, sentence_terms)
+            if not query_terms.isdisjoint(terms)
+        ]
         
         if relevant_sentences:
-            answer = '. '.join(relevant_sentences[:3])  # Take top 3 sentences
-            answer = answer.strip() + '.'
+            answer = ' '.join(relevant_sentences[:3])  # Take top 3 sentences
+            if not answer.endswith(('.', '!', '?')):
+                answer += '.'
             answer += f"\n\n(Source: Page {page})"
             return answer
         else:
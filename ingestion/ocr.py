@@ -1,24 +1,114 @@
 import pytesseract
 from PIL import Image
 import numpy as np
+import re
+from functools import lru_cache
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+_PSM_RE = re.compile(r'--psm\s+(\d+)')
+_OEM_RE = re.compile(r'--oem\s+(\d+)')
+_VAR_RE = re.compile(r'-c\s+(\w+)=(\S+)')
+
+def _parse_config(config: str):
+    """Split a pytesseract-style config string into (psm, oem, variables)
+
+    psm and oem default to Tesseract's own defaults (3, automatic / 3, default).
+    """
+    psm = _PSM_RE.search(config)
+    oem = _OEM_RE.search(config)
+    return (
+        int(psm.group(1)) if psm else 3,
+        int(oem.group(1)) if oem else 3,
+        _VAR_RE.findall(config),
+    )
+
+def _otsu_threshold(gray: np.ndarray) -> int:
+    """Otsu's global threshold for a uint8 grayscale array"""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    omega = np.cumsum(hist) / gray.size               # class probability
+    mu = np.cumsum(hist * np.arange(256)) / gray.size  # class mean * probability
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between_var = (mu[-1] * omega - mu) ** 2 / (omega * (1.0 - omega))
+    return int(np.argmax(np.nan_to_num(between_var)))
 
 class OCREngine:
     """Performs OCR on images and scanned documents"""
     
-    def __init__(self, lang='eng'):
+    # Images below these thresholds cannot hold readable text and skip Tesseract
+    MIN_PIXELS = 32 * 32
+    MIN_STD = 10
+    
+    def __init__(self, lang='eng', upscale: float = 1.5, config: str = '--oem 1 --psm 6'):
         self.lang = lang
+        self.upscale = upscale
+        # LSTM engine on a single uniform block skips most page layout analysis
+        self.config = config
+        self._api = None  # long-lived tesserocr handle, created on first use
+    
+    def _get_api(self):
+        """Tesseract API handle that keeps language data loaded between images"""
+        if self._api is None:
+            # Same settings as the pytesseract path, taken from the config string
+            psm, oem, variables = _parse_config(self.config)
+            self._api = tesserocr.PyTessBaseAPI(lang=self.lang, psm=psm, oem=oem)
+            for name, value in variables:
+                self._api.SetVariable(name, value)
+        return self._api
+    
+    def is_blank(self, gray: np.ndarray) -> bool:
+        """Cheap check for tiny or near-uniform images (icons, rules, backgrounds)"""
+        return gray.size < self.MIN_PIXELS or gray.std() < self.MIN_STD
+    
+    def preprocess(self, image: Image.Image) -> Image.Image:
+        """Grayscale, upscale and binarize an image so Tesseract sees clean glyphs"""
+        gray = image.convert('L')  # Convert to grayscale
+        if self.upscale != 1:
+            size = (int(gray.width * self.upscale), int(gray.height * self.upscale))
+            gray = gray.resize(size, Image.LANCZOS)
+        
+        arr = np.asarray(gray)
+        if cv2 is not None:
+            _, binary = cv2.threshold(arr, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        else:
+            binary = np.where(arr > _otsu_threshold(arr), 255, 0).astype(np.uint8)
+        return Image.fromarray(binary)
     
     def extract_text_from_image(self, image: Image.Image) -> str:
         """Extract text from image using Tesseract"""
         try:
+            gray = image.convert('L')
+            if self.is_blank(np.asarray(gray)):
+                return ""
+            
             # Preprocess image for better OCR
-            img_array = np.array(image.convert('L'))  # Convert to grayscale
-            text = pytesseract.image_to_string(img_array, lang=self.lang)
+            binary = self.preprocess(gray)
+            if tesserocr is not None:
+                api = self._get_api()
+                api.SetImage(binary)
+                text = api.GetUTF8Text()
+            else:
+                # pytesseract starts a tesseract process per call
+                text = pytesseract.image_to_string(binary, lang=self.lang, config=self.config)
             return text.strip()
         except Exception as e:
             print(f"OCR error: {e}")
             return ""
     
+    def close(self):
+        """Release the tesserocr handle, if one was created"""
+        if self._api is not None:
+            self._api.End()
+            self._api = None
+    
     def extract_with_confidence(self, image: Image.Image) -> dict:
         """Extract text with confidence scores"""
         data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
@@ -26,3 +116,25 @@ class OCREngine:
             'text': ' '.join([word for word in data['text'] if word.strip()]),
             'confidence': np.mean([float(c) for c in data['conf'] if c.isdigit() and float(c) > 0])
         }
+
+
+@lru_cache(maxsize=None)
+def _get_engine(lang: str = 'eng') -> OCREngine:
+    """One OCREngine per worker process"""
+    return OCREngine(lang=lang)
+
+
+def init_ocr_worker(lang: str = 'eng'):
+    """Process pool initializer: load Tesseract once when the worker starts"""
+    if tesserocr is None:
+        return
+    try:
+        _get_engine(lang)._get_api()
+    except Exception as e:
+        # A failed warm-up must not break the pool; OCR calls report the error
+        print(f"OCR init error: {e}")
+
+
+def ocr_worker(image: Image.Image, lang: str = 'eng') -> str:
+    """Process pool entry point for OCR on a single image"""
+    return _get_engine(lang).extract_text_from_image(image)
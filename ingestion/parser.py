@@ -2,9 +2,32 @@ import PyPDF2
 import pdfplumber
 from PIL import Image
 import io
-from typing import List, Dict, Any
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import chain
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 
+try:
+    import pypdfium2 as pdfium
+    import pypdfium2.raw as pdfium_c
+except ImportError:
+    pdfium = None
+
+# PDFium is not thread-safe, even across documents, and Streamlit runs each
+# session on its own thread; every pdfium call goes through this lock
+_PDFIUM_LOCK = threading.Lock()
+
+# PIL format names for PDF image codecs, matching what the PyPDF2 path reports;
+# images with only lossless stream filters (Flate, LZW) are named like pypdf does
+_PDF_IMAGE_FORMATS = {
+    'DCTDecode': 'JPEG',
+    'JPXDecode': 'JPEG2000',
+    'CCITTFaxDecode': 'TIFF',
+    'JBIG2Decode': 'JBIG2',
+}
+
 @dataclass
 class DocumentElement:
     """Represents a single element from a document"""
@@ -13,41 +36,119 @@ class DocumentElement:
     page_num: int
     metadata: Dict[str, Any]
 
+def _extract_pages(args: Tuple[str, int, int]) -> List[DocumentElement]:
+    """Process pool entry point: text and tables for pages [start, stop)"""
+    file_path, start, stop = args
+    elements = []
+    
+    # Extract text and tables using pdfplumber
+    with pdfplumber.open(file_path) as pdf:
+        for page_num in range(start + 1, stop + 1):
+            page = pdf.pages[page_num - 1]
+            
+            # Extract text
+            text = page.extract_text()
+            if text and text.strip():
+                elements.append(DocumentElement(
+                    type='text',
+                    content=text,
+                    page_num=page_num,
+                    metadata={'source': 'pdfplumber'}
+                ))
+            
+            # Extract tables
+            tables = page.extract_tables()
+            for table_idx, table in enumerate(tables):
+                if table:
+                    elements.append(DocumentElement(
+                        type='table',
+                        content=table,
+                        page_num=page_num,
+                        metadata={'table_idx': table_idx}
+                    ))
+    
+    return elements
+
 class MultiModalParser:
     """Parses PDFs and extracts text, tables, and images"""
     
-    def __init__(self):
+    def __init__(self, pages_per_task: int = 8, max_workers: Optional[int] = None,
+                 min_image_size: int = 50):
         self.supported_formats = ['.pdf']
+        # Images narrower or shorter than this are icons and rules, not content
+        self.min_image_size = min_image_size
+        self.pages_per_task = pages_per_task
+        self.max_workers = max_workers or os.cpu_count()
     
-    def parse_document(self, file_path: str) -> List[DocumentElement]:
-        """Main parsing function that orchestrates extraction"""
-        elements = []
-        
-        # Extract text and tables using pdfplumber
+    def parse_document(self, file_path: str, executor: Optional[Executor] = None) -> List[DocumentElement]:
+        """Main parsing function that orchestrates extraction
+
+        Text and table extraction is CPU-bound per page, so page ranges are spread
+        over a process pool: the given executor, or a temporary one for long PDFs.
+        """
         with pdfplumber.open(file_path) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                # Extract text
-                text = page.extract_text()
-                if text and text.strip():
+            page_count = len(pdf.pages)
+        tasks = [
+            (file_path, start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+        
+        if executor is not None:
+            results = executor.map(_extract_pages, tasks)
+        elif len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                results = list(pool.map(_extract_pages, tasks))
+        else:
+            results = map(_extract_pages, tasks)
+        elements = list(chain.from_iterable(results))
+        
+        # Extract images in-process; PIL images are costly to pickle
+        elements.extend(self._extract_images(file_path))
+        
+        return elements
+    
+    def _extract_images(self, file_path: str) -> List[DocumentElement]:
+        """Image elements in page order"""
+        if pdfium is None:
+            return list(self._extract_images_pypdf2(file_path))
+        
+        # Collected eagerly so the lock is never held across a yield
+        with _PDFIUM_LOCK:
+            return self._extract_images_pdfium(file_path)
+    
+    def _extract_images_pdfium(self, file_path: str) -> List[DocumentElement]:
+        """Decode image objects with PDFium; the caller holds _PDFIUM_LOCK"""
+        elements = []
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            for page_num, page in enumerate(pdf, 1):
+                for obj in page.get_objects(filter=(pdfium_c.FPDF_PAGEOBJ_IMAGE,)):
+                    try:
+                        if min(obj.get_px_size()) < self.min_image_size:
+                            continue
+                        # Copy out of PDFium's buffer and free the bitmap here, under the lock,
+                        # rather than leaving it to a finalizer on some other thread
+                        bitmap = obj.get_bitmap(render=False)
+                        img = bitmap.to_pil().copy()
+                        bitmap.close()
+                        codecs = obj.get_filters(skip_simple=True)
+                    except Exception:
+                        continue
+                    
                     elements.append(DocumentElement(
-                        type='text',
-                        content=text,
+                        type='image',
+                        content=img,
                         page_num=page_num,
-                        metadata={'source': 'pdfplumber'}
+                        # Decoded bitmaps have no PIL format; name the codec stored in the PDF
+                        metadata={'format': _PDF_IMAGE_FORMATS.get(codecs[-1]) if codecs else 'PNG'}
                     ))
-                
-                # Extract tables
-                tables = page.extract_tables()
-                for table_idx, table in enumerate(tables):
-                    if table:
-                        elements.append(DocumentElement(
-                            type='table',
-                            content=table,
-                            page_num=page_num,
-                            metadata={'table_idx': table_idx}
-                        ))
-        
-        # Extract images using PyPDF2
+                page.close()
+        finally:
+            pdf.close()
+        return elements
+    
+    def _extract_images_pypdf2(self, file_path: str):
+        """Fallback image extraction when pypdfium2 is not installed"""
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
             for page_num, page in enumerate(pdf_reader.pages, 1):
@@ -57,16 +158,16 @@ class MultiModalParser:
                     for obj in xObject:
                         if xObject[obj]['/Subtype'] == '/Image':
                             try:
+                                if min(xObject[obj]['/Width'], xObject[obj]['/Height']) < self.min_image_size:
+                                    continue
                                 img_data = xObject[obj].get_data()
                                 img = Image.open(io.BytesIO(img_data))
                                 
-                                elements.append(DocumentElement(
+                                yield DocumentElement(
                                     type='image',
                                     content=img,
                                     page_num=page_num,
                                     metadata={'format': img.format}
-                                ))
+                                )
                             except:
                                 continue
-        
-        return elements